@@ -4,13 +4,28 @@ import dash
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
+import flask
+import io
+import numpy as np
 import os
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+import pyarrow as pa
+import pyarrow.parquet as pq
 import re
+import uuid
 
 from dash.dependencies import Input, Output
 from datetime import datetime
+from flask_compress import Compress
+from lcn.admission import AdmissionController, get_cost
+from lcn.approximate import format_sample_error, scale_counts
+from lcn.cache import QueryCache, log_query, normalize_filters
+from lcn.dataset import get_dataset_version, load_dataset, optimize_schema
+from scipy import sparse
+from urllib.parse import urlencode
 from zeep import Client
 
 
@@ -26,6 +41,22 @@ def get_exchange_rates():
     return result
 
 
+def get_slim_template(name="plotly"):
+    # Only bar/scatter trace defaults are used, the rest of the template is sent with every figure otherwise.
+    template = go.layout.Template(pio.templates[name])
+    template.data = go.layout.template.Data(bar=template.data.bar, scatter=template.data.scatter)
+
+    return template
+
+
+def strip_etag_encoding(etag):
+    for algorithm in ["br", "gzip", "deflate"]:
+        if etag.endswith(":" + algorithm):
+            return etag[:-len(algorithm) - 1]
+
+    return etag
+
+
 def get_top_horizontal_fig(data, limit, labels, title, height=500, width=480):
     if data.size > 0:
         x_values = data.values[limit:]
@@ -73,7 +104,7 @@ def get_top_vertical_fig(data, labels, title, height=500, width=400):
     return fig
 
 
-def get_salary_fig(data, height=500, width=400):
+def get_salary_stats(data):
     if data.size > 0:
         min_from, min_to = int(data["salary_from"].min()), int(data["salary_to"].min())
         max_from, max_to = int(data["salary_from"].max()), int(data["salary_to"].max())
@@ -92,17 +123,21 @@ def get_salary_fig(data, height=500, width=400):
         min_from, min_to, max_from, max_to = 0, 0, 0, 0
         mean_from, mean_to, median_from, median_to = 0, 0, 0, 0
 
+    return [
+        min_from, min_to,
+        max_from, max_to,
+        mean_from, mean_to,
+        median_from, median_to
+    ]
+
+
+def get_salary_fig(stats, height=500, width=400):
     salary_df = pd.DataFrame({
         "Salary": [
             "Min", "Min", "Max", "Max",
             "Mean", "Mean", "Median", "Median"
         ],
-        "Money": [
-            min_from, min_to,
-            max_from, max_to,
-            mean_from, mean_to,
-            median_from, median_to
-        ],
+        "Money": stats,
         "Fork": [
             "From", "To", "From", "To",
             "From", "To", "From", "To"
@@ -125,31 +160,257 @@ def get_salary_fig(data, height=500, width=400):
     return fig
 
 
+def filter_data(data, position, city, company, keyword=None, tag=None, salary_from=None, salary_to=None,
+                salary_currency=None, start_date=None, end_date=None, keywords_exploded=None, tags_exploded=None):
+    # Primary filters.
+    if position:
+        data = data[data["title"].str.match(position, case=False)]
+
+    if city:
+        data = data[data["city"].str.match(city, case=False)]
+
+    if company:
+        data = data[data["company"].str.match(company, case=False)]
+
+    if keyword:
+        if keywords_exploded is None:
+            keywords_exploded = data["keywords"].explode()
+
+        keywords_index = keywords_exploded.str.match(keyword, case=False, na=False)
+        keywords_index = keywords_index[keywords_index == True]
+        keywords_index = keywords_index[~keywords_index.index.duplicated(keep='first')]
+        data = data[data.index.isin(keywords_index.index)]
+
+    if tag:
+        if tags_exploded is None:
+            tags_exploded = data["tags"].explode()
+
+        tags_index = tags_exploded.str.match(tag, case=False, na=False)
+        tags_index = tags_index[tags_index == True]
+        tags_index = tags_index[~tags_index.index.duplicated(keep='first')]
+        data = data[data.index.isin(tags_index.index)]
+
+    # Salary.
+    if not salary_currency:
+        salary_currency = "RUB"
+
+    if salary_from and salary_to:
+        data = data[(data["salary_from"] >= salary_from) & (data["salary_from"] <= salary_to) &
+                    (data["salary_to"] >= salary_from) & (data["salary_to"] <= salary_to) &
+                    (data["salary_currency"] == salary_currency)]
+    elif salary_from:
+        data = data[(data["salary_from"] >= salary_from) & (data["salary_currency"] == salary_currency)]
+    elif salary_to:
+        data = data[(data["salary_to"] <= salary_to) & (data["salary_currency"] == salary_currency)]
+
+    # Date.
+    if start_date and end_date:
+        data = data[(data["date"] >= start_date) & (data["date"] <= end_date)]
+    elif start_date:
+        data = data[data["date"] >= start_date]
+    elif end_date:
+        data = data[data["date"] <= end_date]
+
+    return data
+
+
+def get_tab2_aggregates(data, scale=1):
+    return {
+        "city": scale_counts(data["city"].value_counts(ascending=True), scale),
+        "company": scale_counts(data["company"].value_counts(ascending=True), scale),
+        "title": scale_counts(data["title"].value_counts(ascending=True), scale),
+        "keywords": scale_counts(data["keywords"].explode().value_counts(ascending=True), scale),
+        "tags": scale_counts(data["tags"].explode().value_counts(ascending=True), scale),
+        "salary": get_salary_stats(data),
+        "currency": scale_counts(data["salary_currency"].value_counts(ascending=True), scale)
+    }
+
+
+def get_tab3_aggregates(data):
+    return {
+        "year": data["year"].value_counts(ascending=True),
+        "month": data["month"].value_counts(ascending=True),
+        "day": data["day"].value_counts(ascending=True),
+        "week_day": data["week_day"].value_counts(ascending=True),
+        "hour": data["hour"].value_counts(ascending=True),
+        "minute": data["minute"].value_counts(ascending=True)
+    }
+
+
+def join_terms(value):
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return ", ".join(str(term) for term in value)
+
+    return ""
+
+
+def get_export_chunks(data, chunk_size, *filters):
+    # Filter row ranges one by one, the whole filtered frame is never materialized.
+    for begin in range(0, len(data), chunk_size):
+        chunk = filter_data(data.iloc[begin:begin + chunk_size], *filters)
+
+        if chunk.size > 0:
+            yield chunk.assign(keywords=chunk["keywords"].map(join_terms), tags=chunk["tags"].map(join_terms))
+
+
+def get_export_csv(data, chunks):
+    yield data.head(0).to_csv(index=False)
+
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=False)
+
+
+class ExportStream(io.RawIOBase):
+    # Write-only sink, keeps absolute position for parquet offsets and hands out written bytes.
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def get_export_schema(data):
+    # Types come from column dtypes, a head sample types object columns without values as null.
+    schema = pa.Schema.from_pandas(data.head(0), preserve_index=False)
+
+    # Object columns hold strings, keywords/tags are joined into strings by get_export_chunks.
+    for index, field in enumerate(schema):
+        if data[field.name].dtype == object:
+            schema = schema.set(index, pa.field(field.name, pa.string()))
+
+    return schema
+
+
+def get_export_parquet(data, chunks):
+    schema = get_export_schema(data)
+
+    stream = ExportStream()
+    writer = pq.ParquetWriter(pa.PythonFile(stream, mode="w"), schema)
+
+    # Every chunk becomes a row group.
+    for chunk in chunks:
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        yield stream.drain()
+
+    writer.close()
+    yield stream.drain()
+
+
+def get_term_day_matrix(data, column, date_min, days):
+    # Rows are term codes, columns are days since date_min, values are vacancy counts.
+    frame = pd.DataFrame({
+        "term": data[column],
+        "day": (data["date"].dt.normalize() - date_min.normalize()).dt.days
+    }).explode("term").dropna(subset=["term"])
+
+    codes, terms = pd.factorize(frame["term"])
+
+    matrix = sparse.csr_matrix(
+        (np.ones(codes.size, dtype=np.int32), (codes, frame["day"].to_numpy(dtype=np.int64))),
+        shape=(terms.size, days)
+    )
+
+    # Case-insensitive lookup, the same term can be spelled differently.
+    lookup = {}
+
+    for code, term in enumerate(terms):
+        lookup.setdefault(str(term).lower(), []).append(code)
+
+    return matrix, lookup
+
+
+def get_trend_fig(matrix, lookup, terms, dates, labels, title, height=500, width=1440):
+    series = []
+
+    for term in terms:
+        codes = lookup.get(term.strip().lower())
+
+        if codes:
+            counts = np.asarray(matrix[codes].sum(axis=0)).ravel()
+            series.append(pd.DataFrame({"x": dates, "y": counts, "term": term.strip()}))
+
+    if series:
+        trend_df = pd.concat(series, ignore_index=True)
+    else:
+        trend_df = pd.DataFrame({"x": [dates[0]], "y": [0], "term": [""]})
+
+    fig = px.line(
+        trend_df,
+        x="x",
+        y="y",
+        color="term",
+        labels=labels,
+        title=title,
+        height=height,
+        width=width
+    )
+
+    fig.update_yaxes(tickformat="d")
+
+    return fig
+
+
 def main():
     # ---------------------------------------------------------------------------------
     # Load data.
-    os.environ.setdefault("LCN_DATA_PATH", "/data/it-three-months.pickle")
+    os.environ.setdefault("LCN_DATA_PATH", "/data/it")
+    os.environ.setdefault("LCN_DATA_PERIOD", "3")
     data_path = os.environ["LCN_DATA_PATH"]
+    data_period = int(os.environ["LCN_DATA_PERIOD"])
+
+    df = load_dataset(data_path, data_period)
 
-    df = pd.read_pickle(data_path)
+    # Narrow dtypes for date parts and salaries.
+    os.environ.setdefault("LCN_OPTIMIZE_SCHEMA", "true")
+
+    if os.environ["LCN_OPTIMIZE_SCHEMA"].lower() == "true":
+        df, schema_report = optimize_schema(df)
+        print("Memory usage (bytes):\n{0}".format(schema_report.to_string()))
 
     keywords_exploded = df["keywords"].explode()
     tags_exploded = df["tags"].explode()
 
-    keywords_unique = keywords_exploded.unique().size
-    tags_unique = tags_exploded.unique().size
+    # The Details tab answers from a sample first and refines to the exact answer on the next interval.
+    os.environ.setdefault("LCN_APPROXIMATE", "false")
+    os.environ.setdefault("LCN_APPROXIMATE_SAMPLE", "0.1")
 
-    keywords_values = keywords_exploded.value_counts(ascending=True)
-    tags_values = tags_exploded.value_counts(ascending=True)
+    approximate = os.environ["LCN_APPROXIMATE"].lower() == "true"
+    approximate_sample = float(os.environ["LCN_APPROXIMATE_SAMPLE"])
+
+    if approximate:
+        df_sample = df.sample(frac=approximate_sample, random_state=0)
+        keywords_exploded_sample = df_sample["keywords"].explode()
+        tags_exploded_sample = df_sample["tags"].explode()
 
+    vacancies_total = df["company"].count()
+
+    keywords_unique = keywords_exploded.unique().size
+    tags_unique = tags_exploded.unique().size
     cities_unique = df["city"].unique().size
     companies_unique = df["company"].unique().size
     positions_unique = df["title"].unique().size
-    vacancies_total = df["company"].count()
 
+    keywords_values = keywords_exploded.value_counts(ascending=True)
+    tags_values = tags_exploded.value_counts(ascending=True)
     cities_values = df["city"].value_counts(ascending=True)
     companies_values = df["company"].value_counts(ascending=True)
     positions_values = df["title"].value_counts(ascending=True)
+
     lang_values = df["lang"].value_counts()
     salary_currency_values = df["salary_currency"].value_counts(ascending=True)
 
@@ -197,6 +458,62 @@ def main():
 
     default_top_limit = -15
 
+    # Shared between server processes, keyed by dataset version and normalized filters.
+    os.environ.setdefault("LCN_CACHE_PATH", "/tmp/lcn-cache.sqlite")
+    os.environ.setdefault("LCN_CACHE_SIZE", "256")
+
+    cache = QueryCache(
+        os.environ["LCN_CACHE_PATH"],
+        get_dataset_version(df),
+        int(os.environ["LCN_CACHE_SIZE"]) * 1024 * 1024
+    )
+
+    # Aggregates of popular queries precomputed for this dataset (lazy-crow-nest-prewarm).
+    os.environ.setdefault("LCN_CACHE_WARM_PATH", data_path.rstrip("/") + ".warm.sqlite")
+
+    if os.path.exists(os.environ["LCN_CACHE_WARM_PATH"]):
+        cache.load(os.environ["LCN_CACHE_WARM_PATH"])
+
+    # Normalized inputs and timings of exact queries, empty path disables the log.
+    os.environ.setdefault("LCN_QUERY_LOG", "/tmp/lcn-queries.jsonl")
+    os.environ.setdefault("LCN_QUERY_LOG_SIZE", "64")
+
+    query_log = os.environ["LCN_QUERY_LOG"]
+    query_log_size = int(os.environ["LCN_QUERY_LOG_SIZE"]) * 1024 * 1024
+
+    # Admission control for expensive callbacks, costs are in passes over the dataset.
+    os.environ.setdefault("LCN_ADMISSION_CAPACITY", "8")
+    os.environ.setdefault("LCN_ADMISSION_QUEUE", "16")
+    os.environ.setdefault("LCN_ADMISSION_SESSION", "2")
+    os.environ.setdefault("LCN_ADMISSION_TIMEOUT", "10")
+
+    admission = AdmissionController(
+        float(os.environ["LCN_ADMISSION_CAPACITY"]),
+        int(os.environ["LCN_ADMISSION_QUEUE"]),
+        int(os.environ["LCN_ADMISSION_SESSION"]),
+        float(os.environ["LCN_ADMISSION_TIMEOUT"])
+    )
+
+    # Filter selectivity is estimated on a small sample.
+    df_estimate = df.sample(n=min(len(df), 1000), random_state=0)
+
+    def get_selectivity(filters):
+        return len(filter_data(df_estimate, *filters)) / max(len(df_estimate), 1)
+
+    os.environ.setdefault("LCN_EXPORT_CHUNK_SIZE", "50000")
+    export_chunk_size = int(os.environ["LCN_EXPORT_CHUNK_SIZE"])
+
+    # Keyword/tag x day matrices for trends, every trend is a row slice.
+    trend_days = (date_max.normalize() - date_min.normalize()).days + 1
+    trend_dates = pd.date_range(date_min.normalize(), periods=trend_days)
+
+    keywords_matrix, keywords_lookup = get_term_day_matrix(df, "keywords", date_min, trend_days)
+    tags_matrix, tags_lookup = get_term_day_matrix(df, "tags", date_min, trend_days)
+
+    default_trend_limit = 5
+    default_trend_keywords = list(keywords_values.keys()[-default_trend_limit:][::-1])
+    default_trend_tags = list(tags_values.keys()[-default_trend_limit:][::-1])
+
     salary_full_amount = df[(df["salary_from"] > 0) & (df["salary_to"] > 0)]["company"].count()
     salary_from_amount = df[(df["salary_from"] > 0) & (df["salary_to"] == 0)]["company"].count()
     salary_to_amount = df[(df["salary_from"] == 0) & (df["salary_to"] > 0)]["company"].count()
@@ -205,16 +522,117 @@ def main():
     # Forming Dash.
     external_stylesheets = ["https://codepen.io/chriddyp/pen/bWLwgP.css"]
 
-    app = dash.Dash(__name__, external_stylesheets=[dbc.themes.SIMPLEX])
+    pio.templates["slim"] = get_slim_template()
+    pio.templates.default = "slim"
+
+    # Dash forces COMPRESS_ALGORITHM to gzip when it compresses by itself, compression is set up here instead.
+    app = dash.Dash(__name__, compress=False, external_stylesheets=[dbc.themes.SIMPLEX])
     app.layout = html.Div(children=[
         dcc.Tabs(id="tabs", value="tab1", children=[
             dcc.Tab(label="Overview", id="tab1", value="tab1", style=tab_style, selected_style=tab_selected_style),
             dcc.Tab(label="Details", id="tab2", value="tab2", style=tab_style, selected_style=tab_selected_style),
             dcc.Tab(label="Timeline", id="tab3", value="tab3", style=tab_style, selected_style=tab_selected_style),
+            dcc.Tab(label="Trend", id="tab4", value="tab4", style=tab_style, selected_style=tab_selected_style),
         ], style=tabs_style),
         html.Div(id="tabs-content")
     ])
 
+    server = app.server
+    server.config.update(
+        COMPRESS_ALGORITHM=["br", "gzip"],
+        COMPRESS_BR_LEVEL=5,
+        COMPRESS_LEVEL=6,
+        COMPRESS_MIN_SIZE=500
+    )
+
+    Compress(server)
+
+    # ---------------------------------------------------------------------------------
+    # Conditional requests.
+
+    # Hooks below are registered after Compress, so they see responses before compression.
+
+    # Tabs content holds only default figures, its responses are rendered once per tab and replayed.
+    rendered_tabs = {}
+    rendered_tab_ids = ("tab1", "tab2", "tab3", "tab4")
+
+    def get_rendered_tab():
+        if flask.request.method != "POST" or flask.request.path != "/_dash-update-component":
+            return None
+
+        body = flask.request.get_json(silent=True)
+
+        if not isinstance(body, dict) or body.get("output") != "tabs-content.children":
+            return None
+
+        try:
+            tab = body["inputs"][0]["value"]
+        except (KeyError, IndexError, TypeError):
+            return None
+
+        # Only known tabs are stored, any other value is rendered as usual.
+        return tab if isinstance(tab, str) and tab in rendered_tab_ids else None
+
+    @server.before_request
+    def get_cached_tab():
+        tab = get_rendered_tab()
+
+        if tab in rendered_tabs:
+            return flask.Response(rendered_tabs[tab], mimetype="application/json")
+
+    @server.after_request
+    def set_etag(response):
+        if response.status_code != 200 or response.is_streamed:
+            return response
+
+        tab = get_rendered_tab()
+
+        if tab is not None:
+            rendered_tabs.setdefault(tab, response.get_data())
+            return response
+
+        if flask.request.method not in ("GET", "HEAD"):
+            return response
+
+        # ETag of the uncompressed body, clients echo it back with the encoding suffix added by Compress.
+        if not response.get_etag()[0]:
+            response.add_etag()
+
+        etag = response.get_etag()[0]
+        client_etags = flask.request.if_none_match.as_set(include_weak=True)
+
+        if etag in {strip_etag_encoding(client_etag) for client_etag in client_etags}:
+            not_modified = flask.Response(status=304)
+            not_modified.set_etag(etag)
+
+            return not_modified
+
+        return response
+
+    # ---------------------------------------------------------------------------------
+    # Sessions.
+
+    def get_session():
+        return flask.request.cookies.get("lcn_session") or flask.request.remote_addr
+
+    def is_load_test():
+        # Synthetic traffic of lazy-crow-nest-loadtest --url: not replayed by prewarm, not evicting real cache entries.
+        return bool(flask.request.headers.get("X-LCN-Load-Test"))
+
+    def get_query_log():
+        return None if is_load_test() else query_log
+
+    def put_cache(key, aggregates):
+        if not is_load_test():
+            cache.put(key, aggregates)
+
+    @server.after_request
+    def set_session(response):
+        if "lcn_session" not in flask.request.cookies:
+            response.set_cookie("lcn_session", uuid.uuid4().hex, httponly=True, samesite="Lax")
+
+        return response
+
     @app.callback(Output("tabs-content", "children"), Input("tabs", "value"))
     def render_content(tab):
         if tab == "tab1":
@@ -346,7 +764,7 @@ def main():
                     ),
                     dcc.Graph(
                         id="tab1-salary-range",
-                        figure=get_salary_fig(df, width=350),
+                        figure=get_salary_fig(get_salary_stats(df), width=350),
                         style=default_style
                     ),
                     dcc.Graph(
@@ -460,7 +878,17 @@ def main():
                             max_date_allowed=date_max.date(),
                             style=date_style
                         )
-                    ], style=default_style)
+                    ], style=default_style),
+                    html.Div(children=[
+                        dcc.Markdown("&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;&nbsp;")
+                    ], style=default_style),
+                    html.Div(children=[
+                        html.H5("Export:"),
+                        html.A("CSV", id="tab2-export-csv-link", href="/export?format=csv"),
+                        dcc.Markdown("&nbsp;&nbsp;", style=default_style),
+                        html.A("Parquet", id="tab2-export-parquet-link", href="/export?format=parquet"),
+                    ], style=default_style),
+                    dcc.Interval(id="tab2-refine-interval", interval=100, n_intervals=0, max_intervals=0)
                 ]),
                 html.Div(children=[
                     dcc.Graph(
@@ -517,7 +945,7 @@ def main():
                     ),
                     dcc.Graph(
                         id="tab2-salary-range",
-                        figure=get_salary_fig(df),
+                        figure=get_salary_fig(get_salary_stats(df)),
                         style=default_style
                     ),
                     dcc.Graph(
@@ -619,6 +1047,47 @@ def main():
                 ])
             ])
 
+        elif tab == "tab4":
+            return html.Div(children=[
+                html.Div(children=[
+                    html.H5("Filters:"),
+                    dcc.Input(
+                        id="tab4-keyword-input",
+                        type="text",
+                        placeholder="Kubernetes, Docker",
+                    ),
+                    dcc.Input(
+                        id="tab4-tag-input",
+                        type="text",
+                        placeholder="Linux, SQL",
+                    ),
+                ], style={"width": "100%", "display": "flex", "align-items": "center", "justify-content": "center"}),
+                html.Div(children=[
+                    dcc.Graph(
+                        id="tab4-trend-keyword-graph",
+                        figure=get_trend_fig(
+                            keywords_matrix,
+                            keywords_lookup,
+                            default_trend_keywords,
+                            trend_dates,
+                            {"x": "Date", "y": "Amount", "term": "Keyword"},
+                            "Keyword Trend"
+                        )
+                    ),
+                    dcc.Graph(
+                        id="tab4-trend-tag-graph",
+                        figure=get_trend_fig(
+                            tags_matrix,
+                            tags_lookup,
+                            default_trend_tags,
+                            trend_dates,
+                            {"x": "Date", "y": "Amount", "term": "Tag"},
+                            "Tag Trend"
+                        )
+                    )
+                ])
+            ])
+
     # ---------------------------------------------------------------------------------
     # Callback functions.
 
@@ -632,8 +1101,10 @@ def main():
             Output("tab2-keyword-graph", "figure"),
             Output("tab2-tag-graph", "figure"),
             Output("tab2-salary-range", "figure"),
-            Output("tab2-top-salary-currency", "figure")
-
+            Output("tab2-top-salary-currency", "figure"),
+            Output("tab2-export-csv-link", "href"),
+            Output("tab2-export-parquet-link", "href"),
+            Output("tab2-refine-interval", "max_intervals")
         ],
         [
             Input("tab2-position-input", "value"),
@@ -648,57 +1119,73 @@ def main():
             Input("tab2-tag-max-input", "value"),
             Input("tab2-date-input", "start_date"),
             Input("tab2-date-input", "end_date"),
+            Input("tab2-refine-interval", "n_intervals")
         ]
     )
     def update_tab2(*args):
         begin_time = time.time()
 
         position, city, company, keyword, tag, salary_from, salary_to, salary_currency, keyword_max, tag_max, \
-            start_date, end_date = args
-        data = df
-
-        # Primary filters.
-        if position:
-            data = data[data["title"].str.match(position, case=False)]
-
-        if city:
-            data = data[data["city"].str.match(city, case=False)]
-
-        if company:
-            data = data[data["company"].str.match(company, case=False)]
-
-        if keyword:
-            keywords_index = keywords_exploded.str.match(keyword, case=False, na=False)
-            keywords_index = keywords_index[keywords_index == True]
-            keywords_index = keywords_index[~keywords_index.index.duplicated(keep='first')]
-            data = data[data.index.isin(keywords_index.index)]
-
-        if tag:
-            tags_index = tags_exploded.str.match(tag, case=False, na=False)
-            tags_index = tags_index[tags_index == True]
-            tags_index = tags_index[~tags_index.index.duplicated(keep='first')]
-            data = data[data.index.isin(tags_index.index)]
-
-        # Salary.
-        if not salary_currency:
-            salary_currency = "RUB"
-
-        if salary_from and salary_to:
-            data = data[(data["salary_from"] >= salary_from) & (data["salary_from"] <= salary_to) &
-                        (data["salary_to"] >= salary_from) & (data["salary_to"] <= salary_to) &
-                        (data["salary_currency"] == salary_currency)]
-        elif salary_from:
-            data = data[(data["salary_from"] >= salary_from) & (data["salary_currency"] == salary_currency)]
-        elif salary_to:
-            data = data[(data["salary_to"] <= salary_to) & (data["salary_currency"] == salary_currency)]
-
-        # Date.
-        if start_date and end_date:
-            data = data[(data["date"] >= start_date) & (data["date"] <= end_date)]
-        elif start_date:
-            data = data[data["date"] >= start_date]
-        elif end_date:
-            data = data[data["date"] <= end_date]
+            start_date, end_date, refine_intervals = args
+
+        triggered = [trigger["prop_id"] for trigger in dash.callback_context.triggered]
+        refined = "tab2-refine-interval.n_intervals" in triggered
+
+        salary_currency = (salary_currency or "RUB") if salary_from or salary_to else None
+
+        filters = normalize_filters(
+            position, city, company, keyword, tag, salary_from, salary_to, salary_currency, start_date, end_date
+        )
+
+        # Export links follow the filters even when the figures are not updated.
+        export_args = {
+            name: value for name, value in zip(
+                ["position", "city", "company", "keyword", "tag", "salary_from", "salary_to", "salary_currency",
+                 "start_date", "end_date"],
+                filters
+            ) if value
+        }
+
+        export_hrefs = [
+            "/export?" + urlencode(dict(export_args, format="csv")),
+            "/export?" + urlencode(dict(export_args, format="parquet"))
+        ]
+
+        key = ("tab2",) + filters
+        aggregates = cache.get(key)
+
+        # Approximate mode: a cache miss is answered from the sample first, exactly on the next refine interval.
+        sampled = aggregates is None and approximate and not refined
+        shed = False
+
+        # Exact aggregates are shared between workers and computed only when admitted.
+        if aggregates is None and not sampled:
+            cost = get_cost(filters, get_selectivity(filters), (keyword_max or 0) + (tag_max or 0))
+
+            with admission.admit(get_session(), cost) as admitted:
+                if admitted:
+                    aggregates = get_tab2_aggregates(
+                        filter_data(df, *filters, keywords_exploded=keywords_exploded, tags_exploded=tags_exploded)
+                    )
+                    put_cache(key, aggregates)
+
+            # Another worker may have computed it while this request waited.
+            if aggregates is None:
+                aggregates = cache.get(key)
+
+            # Overloaded: the sample answers if there is one, otherwise figures stay as they are.
+            if aggregates is None:
+                if not approximate:
+                    return ["Details (busy)"] + [dash.no_update] * 7 + export_hrefs + [dash.no_update]
+
+                sampled, shed = True, True
+
+        if sampled:
+            data = filter_data(
+                df_sample, *filters, keywords_exploded=keywords_exploded_sample, tags_exploded=tags_exploded_sample
+            )
+            sample_error = format_sample_error(len(data), approximate_sample)
+            aggregates = get_tab2_aggregates(data, scale=1 / approximate_sample)
 
         # Resize bars if needed.
         if keyword_max and keyword_max > 15:
@@ -715,61 +1202,99 @@ def main():
             tag_height = 500
             tag_max = default_top_limit
 
-        city_top = data["city"].value_counts(ascending=True)
-        company_top = data["company"].value_counts(ascending=True)
-        title_top = data["title"].value_counts(ascending=True)
-        keywords_top = data["keywords"].explode().value_counts(ascending=True)
-        tags_top = data["tags"].explode().value_counts(ascending=True)
-        salary_fig = get_salary_fig(data)
-        currency_top = data["salary_currency"].value_counts(ascending=True)
-
         end_time = time.time()
 
+        if not sampled:
+            log_query(get_query_log(), "tab2", filters, end_time - begin_time, query_log_size)
+
+        if shed:
+            label = "Details (busy, {0}, {1:.2f}s)".format(sample_error, end_time - begin_time)
+        elif sampled:
+            label = "Details ({0}, {1:.2f}s)".format(sample_error, end_time - begin_time)
+        else:
+            label = "Details ({:.2f}s)".format(end_time - begin_time)
+
         figs = [
-            "Details ({:.2f}s)".format(end_time - begin_time),
+            label,
             get_top_horizontal_fig(
-                city_top,
+                aggregates["city"],
                 default_top_limit,
                 {"x": "Amount", "y": "City"},
                 "City"
             ),
             get_top_horizontal_fig(
-                company_top,
+                aggregates["company"],
                 default_top_limit,
                 {"x": "Amount", "y": "Company"},
                 "Company"
             ),
             get_top_horizontal_fig(
-                title_top,
+                aggregates["title"],
                 default_top_limit,
                 {"x": "Amount", "y": "Position"},
                 "Position"
             ),
             get_top_horizontal_fig(
-                keywords_top,
+                aggregates["keywords"],
                 keyword_max,
                 {"x": "Amount", "y": "Keyword"},
                 "Keyword",
                 height=keyword_height
             ),
             get_top_horizontal_fig(
-                tags_top,
+                aggregates["tags"],
                 tag_max,
                 {"x": "Amount", "y": "Tag"},
                 "Tag",
                 height=tag_height
             ),
-            salary_fig,
+            get_salary_fig(aggregates["salary"]),
             get_top_vertical_fig(
-                currency_top,
+                aggregates["currency"],
                 {"x": "Currency", "y": "Amount"},
                 "Salary Currency",
                 width=350
-            )
+            ),
+            *export_hrefs,
+            refine_intervals + 1 if sampled and not shed else dash.no_update
         ]
 
         return figs
 
+    # Export of Tab 2 filtered rows.
+    @app.server.route("/export")
+    def export():
+        args = flask.request.args
+
+        filters = [
+            args.get("position"),
+            args.get("city"),
+            args.get("company"),
+            args.get("keyword"),
+            args.get("tag"),
+            args.get("salary_from", type=float),
+            args.get("salary_to", type=float),
+            args.get("salary_currency"),
+            args.get("start_date"),
+            args.get("end_date")
+        ]
+
+        chunks = get_export_chunks(df, export_chunk_size, *filters)
+        export_format = args.get("format", "csv")
+
+        if export_format == "csv":
+            body, mimetype = get_export_csv(df, chunks), "text/csv"
+        elif export_format == "parquet":
+            body, mimetype = get_export_parquet(df, chunks), "application/octet-stream"
+        else:
+            flask.abort(400)
+
+        return flask.Response(
+            flask.stream_with_context(body),
+            mimetype=mimetype,
+            headers={"Content-Disposition": "attachment; filename=vacancies.{0}".format(export_format)}
+        )
+
     # Tab 3.
     @app.callback(
         [
@@ -790,61 +1315,61 @@ def main():
     def update_tab3(*args):
         begin_time = time.time()
 
-        position, city, company = args
-        data = df
+        filters = normalize_filters(*args)
 
-        if position:
-            data = data[data["title"].str.match(position, case=False)]
+        key = ("tab3",) + filters
+        aggregates = cache.get(key)
 
-        if city:
-            data = data[data["city"].str.match(city, case=False)]
+        if aggregates is None:
+            with admission.admit(get_session(), get_cost(filters, get_selectivity(filters), 0)) as admitted:
+                if admitted:
+                    aggregates = get_tab3_aggregates(filter_data(df, *filters))
+                    put_cache(key, aggregates)
 
-        if company:
-            data = data[data["company"].str.match(company, case=False)]
+            if aggregates is None:
+                aggregates = cache.get(key)
 
-        year = data["year"].value_counts(ascending=True)
-        month = data["month"].value_counts(ascending=True)
-        day = data["day"].value_counts(ascending=True)
-        week_day = data["week_day"].value_counts(ascending=True)
-        hour = data["hour"].value_counts(ascending=True)
-        minute = data["minute"].value_counts(ascending=True)
+            if aggregates is None:
+                return ["Timeline (busy)"] + [dash.no_update] * 6
 
         end_time = time.time()
 
+        log_query(get_query_log(), "tab3", filters, end_time - begin_time, query_log_size)
+
         figs = [
             "Timeline ({:.2f}s)".format(end_time - begin_time),
             get_top_vertical_fig(
-                year,
+                aggregates["year"],
                 {"x": "Year", "y": "Amount"},
                 "Per Year",
                 width=500
             ),
             get_top_vertical_fig(
-                month,
+                aggregates["month"],
                 {"x": "Month", "y": "Amount"},
                 "Per Month",
                 width=500
             ),
             get_top_vertical_fig(
-                day,
+                aggregates["day"],
                 {"x": "Month Day", "y": "Amount"},
                 "Per Day",
                 width=500
             ),
             get_top_vertical_fig(
-                week_day,
+                aggregates["week_day"],
                 {"x": "Week Day", "y": "Amount"},
                 "Per Week Day",
                 width=500
             ),
             get_top_vertical_fig(
-                hour,
+                aggregates["hour"],
                 {"x": "Hour", "y": "Amount"},
                 "Per Hour",
                 width=500
             ),
             get_top_vertical_fig(
-                minute,
+                aggregates["minute"],
                 {"x": "Minute", "y": "Amount"},
                 "Per Minute",
                 width=500
@@ -853,6 +1378,55 @@ def main():
 
         return figs
 
+    # Tab 4.
+    @app.callback(
+        [
+            Output("tab4", "label"),
+            Output("tab4-trend-keyword-graph", "figure"),
+            Output("tab4-trend-tag-graph", "figure"),
+        ],
+        [
+            Input("tab4-keyword-input", "value"),
+            Input("tab4-tag-input", "value")
+        ]
+    )
+    def update_tab4(*args):
+        begin_time = time.time()
+
+        keyword, tag = args
+
+        # Comma separated lists, one series per term.
+        keywords = keyword.split(",") if keyword else default_trend_keywords
+        tags = tag.split(",") if tag else default_trend_tags
+
+        keyword_fig = get_trend_fig(
+            keywords_matrix,
+            keywords_lookup,
+            keywords,
+            trend_dates,
+            {"x": "Date", "y": "Amount", "term": "Keyword"},
+            "Keyword Trend"
+        )
+
+        tag_fig = get_trend_fig(
+            tags_matrix,
+            tags_lookup,
+            tags,
+            trend_dates,
+            {"x": "Date", "y": "Amount", "term": "Tag"},
+            "Tag Trend"
+        )
+
+        end_time = time.time()
+
+        figs = [
+            "Trend ({:.2f}s)".format(end_time - begin_time),
+            keyword_fig,
+            tag_fig
+        ]
+
+        return figs
+
     app.run_server(debug=False, dev_tools_ui=False, dev_tools_props_check=False, host="0.0.0.0")
 
 
@@ -0,0 +1,71 @@
+import threading
+
+from contextlib import contextmanager
+
+
+def get_cost(filters, selectivity, limits):
+    # Work units, one unit is about one pass over the dataset:
+    # every regex filter scans a full column, aggregates scan the selected rows, figures grow with bar limits.
+    applied = sum(1 for value in filters if value)
+
+    return 1 + applied + 5 * selectivity + limits / 500
+
+
+class AdmissionController:
+    # Bounded queue in front of expensive callbacks, admitted requests never exceed capacity work units.
+    def __init__(self, capacity, queue_size, session_limit, timeout):
+        self.capacity = capacity
+        self.queue_size = queue_size
+        self.session_limit = session_limit
+        self.timeout = timeout
+
+        self.condition = threading.Condition()
+        self.load = 0
+        self.waiting = 0
+        self.sessions = {}
+
+    def acquire(self, session, cost):
+        # The most expensive requests still run, but alone.
+        cost = min(cost, self.capacity)
+
+        with self.condition:
+            if self.sessions.get(session, 0) >= self.session_limit or self.waiting >= self.queue_size:
+                return None
+
+            self.sessions[session] = self.sessions.get(session, 0) + 1
+            self.waiting += 1
+
+            try:
+                admitted = self.condition.wait_for(lambda: self.load + cost <= self.capacity, self.timeout)
+            finally:
+                self.waiting -= 1
+
+            if not admitted:
+                self.release_session(session)
+                return None
+
+            self.load += cost
+
+            return cost
+
+    def release(self, session, cost):
+        with self.condition:
+            self.load -= cost
+            self.release_session(session)
+            self.condition.notify_all()
+
+    def release_session(self, session):
+        self.sessions[session] -= 1
+
+        if self.sessions[session] == 0:
+            del self.sessions[session]
+
+    @contextmanager
+    def admit(self, session, cost):
+        cost = self.acquire(session, cost)
+
+        try:
+            yield cost is not None
+        finally:
+            if cost is not None:
+                self.release(session, cost)
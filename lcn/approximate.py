@@ -0,0 +1,20 @@
+import numpy as np
+
+
+def scale_counts(values, scale):
+    if scale == 1:
+        return values
+
+    return (values * scale).round().astype(np.int64)
+
+
+def get_sample_error(rows, fraction):
+    # 95% relative error of a count estimated from rows matched in a simple random sample.
+    if rows == 0 or fraction >= 1:
+        return 0.0 if fraction >= 1 else 1.0
+
+    return min(1.0, 1.96 * np.sqrt((1 - fraction) / rows))
+
+
+def format_sample_error(rows, fraction):
+    return "~{0:.0%} ±{1:.0%}".format(fraction, get_sample_error(rows, fraction))
@@ -0,0 +1,155 @@
+import json
+import numpy as np
+import os
+import pandas as pd
+import sqlite3
+import time
+
+from contextlib import closing
+
+
+def normalize_filters(*filters):
+    result = []
+
+    for value in filters:
+        # Filters are regexes, only blank ones are dropped: "Java " and "Java" match different rows.
+        if isinstance(value, str) and not value.strip():
+            value = None
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+
+        # Empty filters are not applied, all of them are the same key.
+        result.append(value if value else None)
+
+    return tuple(result)
+
+
+def encode_value(value):
+    if isinstance(value, pd.Series):
+        return {"__series__": [value.name, value.index.tolist(), value.tolist(), str(value.dtype)]}
+
+    if isinstance(value, np.generic):
+        return value.item()
+
+    raise TypeError("{0} is not cacheable".format(type(value).__name__))
+
+
+def decode_value(value):
+    if "__series__" in value:
+        name, index, values, dtype = value["__series__"]
+        return pd.Series(values, index=index, name=name, dtype=dtype)
+
+    return value
+
+
+def dump_value(value):
+    # JSON, not pickle: the cache file may be writable by others and must not run code on load.
+    return json.dumps(value, ensure_ascii=False, default=encode_value).encode("utf-8")
+
+
+def load_value(blob):
+    return json.loads(blob, object_hook=decode_value)
+
+
+def log_query(path, tab, filters, duration, max_size=0):
+    if not path:
+        return
+
+    # One short line per query, appends of this size are atomic between workers.
+    line = json.dumps({"tab": tab, "filters": list(filters), "time": round(duration, 4)}, ensure_ascii=False)
+
+    # Rotated into <path>.1 at max_size, the log never takes more than twice of it.
+    try:
+        if max_size and os.path.getsize(path) >= max_size:
+            os.replace(path, path + ".1")
+    except OSError:
+        pass
+
+    with open(path, "a", encoding="utf-8") as log:
+        log.write(line + "\n")
+
+
+def read_query_log(path):
+    # Rotated queries are older, they go first.
+    paths = [path + ".1"] if os.path.exists(path + ".1") else []
+
+    for name in paths + [path]:
+        with open(name, encoding="utf-8") as log:
+            for line in log:
+                try:
+                    query = json.loads(line)
+                except ValueError:
+                    continue
+
+                yield query["tab"], tuple(query["filters"]), query["time"]
+
+
+class QueryCache:
+    # Aggregates shared by all server processes through one sqlite file, least recently used are evicted first.
+    def __init__(self, path, version, max_size):
+        self.path = path
+        self.version = version
+        self.max_size = max_size
+
+        with closing(self.connect()) as connection, connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, size INTEGER, accessed REAL)"
+            )
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def key(self, filters):
+        return json.dumps([self.version] + list(filters), ensure_ascii=False, default=str)
+
+    def evict(self, connection):
+        # Keep the most recently used entries that fit into max_size.
+        connection.execute(
+            "DELETE FROM cache WHERE key IN ("
+            "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed DESC) AS total FROM cache) "
+            "WHERE total > ?)",
+            (self.max_size,)
+        )
+
+    def get(self, filters):
+        key = self.key(filters)
+
+        with closing(self.connect()) as connection, connection:
+            row = connection.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+
+            if row is None:
+                return None
+
+            connection.execute("UPDATE cache SET accessed = ? WHERE key = ?", (time.time(), key))
+
+        try:
+            return load_value(row[0])
+        except (ValueError, TypeError):
+            # Written by an older version or not by us at all, computed again.
+            return None
+
+    def put(self, filters, value):
+        blob = dump_value(value)
+
+        if len(blob) > self.max_size:
+            return
+
+        with closing(self.connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (self.key(filters), blob, len(blob), time.time())
+            )
+
+            self.evict(connection)
+
+    def load(self, path):
+        # Entries of a warm cache file built for the same dataset version.
+        with closing(self.connect()) as connection, connection:
+            connection.execute("ATTACH DATABASE ? AS warm", (path,))
+            connection.execute(
+                "INSERT OR IGNORE INTO cache SELECT key, value, size, ? FROM warm.cache WHERE key LIKE ?",
+                (time.time(), json.dumps([self.version])[:-1] + ",%")
+            )
+
+            self.evict(connection)
@@ -0,0 +1,89 @@
+import argparse
+import hashlib
+import numpy as np
+import os
+import pandas as pd
+
+
+def write_partitions(df, path):
+    os.makedirs(path, exist_ok=True)
+
+    # One pickle per month, rows sorted by date so that periods are contiguous.
+    df = df.sort_values("date", kind="stable")
+
+    for month, partition in df.groupby(df["date"].dt.to_period("M"), sort=True):
+        partition.attrs = dict(df.attrs)
+        partition.to_pickle(os.path.join(path, "{0}.pickle".format(month)))
+
+
+def load_dataset(path, months=None):
+    # Legacy single pickle.
+    if not os.path.isdir(path):
+        return pd.read_pickle(path)
+
+    names = sorted(name for name in os.listdir(path) if name.endswith(".pickle"))
+
+    # Rolling period needs one extra partition for the partial month at its start.
+    if months:
+        names = names[-(months + 1):]
+
+    partitions = [pd.read_pickle(os.path.join(path, name)) for name in names]
+
+    df = pd.concat(partitions)
+
+    # Rows are sorted by date, the period is a row slice of the loaded partitions.
+    if months:
+        cutoff = df["date"].iloc[-1] - pd.DateOffset(months=months)
+        df = df.iloc[df["date"].searchsorted(cutoff):]
+
+    df.attrs = dict(partitions[-1].attrs)
+
+    return df
+
+
+def get_dataset_version(df):
+    version = [df.attrs.get("generated", "unknown"), len(df), str(df["date"].min()), str(df["date"].max())]
+
+    return hashlib.sha1(repr(version).encode()).hexdigest()[:16]
+
+
+def optimize_schema(df):
+    before = df.memory_usage(deep=True, index=False)
+    columns = {}
+
+    # Date parts fit into int8/int16.
+    for column in ["year", "month", "day", "week_day", "hour", "minute"]:
+        if column in df and pd.api.types.is_integer_dtype(df[column]):
+            columns[column] = pd.to_numeric(df[column], downcast="integer")
+
+    # Salaries are whole numbers, int32 if all of them fit.
+    int32 = np.iinfo(np.int32)
+
+    for column in ["salary_from", "salary_to"]:
+        if column in df and pd.api.types.is_numeric_dtype(df[column]):
+            values = df[column]
+
+            if values.notna().all() and (values % 1 == 0).all() and \
+                    values.min() >= int32.min and values.max() <= int32.max:
+                columns[column] = values.astype(np.int32)
+
+    df = df.assign(**columns)
+    after = df.memory_usage(deep=True, index=False)
+
+    report = pd.DataFrame({"before": before, "after": after, "dtype": df.dtypes.astype(str)})
+    report.loc["total"] = [before.sum(), after.sum(), ""]
+
+    return df, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a dataset pickle into monthly partitions.")
+    parser.add_argument("source", help="dataset pickle")
+    parser.add_argument("destination", help="partitions directory")
+    args = parser.parse_args()
+
+    write_partitions(pd.read_pickle(args.source), args.destination)
+
+
+if __name__ == "__main__":
+    main()
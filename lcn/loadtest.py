@@ -0,0 +1,276 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+
+from lcn.cache import read_query_log
+
+# Query log filters in the order they are logged by update_tab2/update_tab3.
+TAB2_FILTER_INPUTS = [
+    "tab2-position-input.value",
+    "tab2-city-input.value",
+    "tab2-company-input.value",
+    "tab2-keyword-input.value",
+    "tab2-tag-input.value",
+    "tab2-salary-from-input.value",
+    "tab2-salary-to-input.value",
+    "tab2-salary-currency-input.value",
+    "tab2-date-input.start_date",
+    "tab2-date-input.end_date"
+]
+
+TAB3_FILTER_INPUTS = [
+    "tab3-position-input.value",
+    "tab3-city-input.value",
+    "tab3-company-input.value"
+]
+
+# Used when no query log is given.
+DEFAULT_QUERIES = [
+    ("tab2", ()),
+    ("tab2", ("Python",)),
+    ("tab2", ("Java", "Москва")),
+    ("tab2", (None, None, "Яндекс")),
+    ("tab2", (None, None, None, "Kubernetes")),
+    ("tab2", (None, None, None, None, "Linux")),
+    ("tab2", ("Разработчик", None, None, None, None, 100000.0, 300000.0, "RUB")),
+    ("tab3", ()),
+    ("tab3", ("Python",)),
+    ("tab3", (None, "Санкт-Петербург")),
+    ("tab3", (None, None, "Сбер"))
+]
+
+
+def request(url, path, payload=None, timeout=60, session=None, load_test=False):
+    data = json.dumps(payload).encode() if payload is not None else None
+    headers = {"Content-Type": "application/json"} if payload is not None else {}
+
+    # Not written to the query log and the cache of a server that also serves users.
+    if load_test:
+        headers["X-LCN-Load-Test"] = "1"
+
+    if session:
+        headers["Cookie"] = "lcn_session={0}".format(session)
+
+    with urllib.request.urlopen(urllib.request.Request(url + path, data, headers), timeout=timeout) as response:
+        return response.status, response.read()
+
+
+def is_shed(body):
+    # Shed callbacks still answer 200, only the tab label tells they were busy.
+    try:
+        response = json.loads(body)["response"]
+    except (ValueError, KeyError, TypeError):
+        return False
+
+    return any("busy" in str(response.get(tab, {}).get("label", "")) for tab in ("tab2", "tab3"))
+
+
+def get_rss(pid):
+    # Resident memory of the server process in megabytes (Linux).
+    try:
+        with open("/proc/{0}/status".format(pid)) as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    return 0
+
+
+def get_callbacks(url):
+    _, body = request(url, "/_dash-dependencies")
+    callbacks = {}
+
+    for dependency in json.loads(body):
+        if "tabs-content.children" in dependency["output"]:
+            callbacks["render_content"] = dependency
+        elif "tab2.label" in dependency["output"]:
+            callbacks["update_tab2"] = dependency
+        elif "tab3.label" in dependency["output"]:
+            callbacks["update_tab3"] = dependency
+
+    return callbacks
+
+
+def get_payload(dependency, values):
+    outputs = []
+
+    for output in dependency["output"].strip(".").split("..."):
+        component_id, component_property = output.rsplit(".", 1)
+        outputs.append({"id": component_id, "property": component_property})
+
+    inputs = []
+
+    for item in dependency["inputs"]:
+        prop_id = "{0}.{1}".format(item["id"], item["property"])
+        value = values.get(prop_id, 0 if item["property"] == "n_intervals" else None)
+        inputs.append({"id": item["id"], "property": item["property"], "value": value})
+
+    changed = [prop_id for prop_id in values if values[prop_id] is not None] or \
+        ["{0}.{1}".format(dependency["inputs"][0]["id"], dependency["inputs"][0]["property"])]
+
+    return {
+        "output": dependency["output"],
+        "outputs": outputs if len(outputs) > 1 else outputs[0],
+        "inputs": inputs,
+        "changedPropIds": changed,
+        "state": []
+    }
+
+
+def get_sessions(callbacks, queries):
+    # A session opens a tab and runs one query on it, like a user does.
+    sessions = []
+
+    for tab, filters in queries:
+        if tab == "tab2":
+            names, callback = TAB2_FILTER_INPUTS, callbacks["update_tab2"]
+        elif tab == "tab3":
+            names, callback = TAB3_FILTER_INPUTS, callbacks["update_tab3"]
+        else:
+            continue
+
+        sessions.append([
+            get_payload(callbacks["render_content"], {"tabs.value": tab}),
+            get_payload(callback, dict(zip(names, filters)))
+        ])
+
+    sessions.append([get_payload(callbacks["render_content"], {"tabs.value": "tab1"})])
+
+    return sessions
+
+
+def run_level(url, sessions, concurrency, duration, pid, timeout, load_test):
+    results = []
+    rss = []
+    lock = threading.Lock()
+    deadline = time.time() + duration
+
+    def worker():
+        # Every simulated user has its own session for per-session limits.
+        session = uuid.uuid4().hex
+
+        while time.time() < deadline:
+            for payload in random.choice(sessions):
+                begin_time = time.time()
+
+                try:
+                    status, body = request(url, "/_dash-update-component", payload, timeout, session, load_test)
+                    failed, shed = status not in (200, 204), is_shed(body)
+                except OSError:
+                    failed, shed = True, False
+
+                with lock:
+                    results.append((time.time() - begin_time, failed, shed))
+
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+
+    for thread in workers:
+        thread.start()
+
+    while any(thread.is_alive() for thread in workers):
+        if pid:
+            rss.append(get_rss(pid))
+
+        time.sleep(0.5)
+
+    latencies = sorted(latency for latency, _, _ in results) or [0]
+
+    def percentile(value):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * value))] * 1000
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "throughput": len(results) / duration,
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+        "errors": sum(failed for _, failed, _ in results) / max(len(results), 1),
+        "shed": sum(shed for _, _, shed in results) / max(len(results), 1),
+        "rss": max(rss or [0])
+    }
+
+
+def start_server(port, startup_timeout, cache_path, cache=True):
+    # Own cache file: nothing is evicted from other caches on the host, every run starts cold.
+    env = dict(os.environ, PORT=str(port), LCN_QUERY_LOG="", LCN_CACHE_PATH=cache_path)
+
+    if not cache:
+        env["LCN_CACHE_SIZE"] = "0"
+
+    server = subprocess.Popen([sys.executable, "-m", "lcn"], env=env)
+    url = "http://127.0.0.1:{0}".format(port)
+    deadline = time.time() + startup_timeout
+
+    # Dataset loading takes a while.
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("server exited with code {0}".format(server.returncode))
+
+        try:
+            request(url, "/_dash-dependencies", timeout=5)
+            return server, url
+        except OSError:
+            time.sleep(1)
+
+    server.terminate()
+    raise RuntimeError("server did not start in {0}s".format(startup_timeout))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test Dash callbacks with simulated sessions.")
+    parser.add_argument("--url", help="running server, a local server is started if not set")
+    parser.add_argument("--pid", type=int, help="pid of the running server for RSS")
+    parser.add_argument("--port", type=int, default=8051, help="port of the local server")
+    parser.add_argument("--log", help="query log to replay, built-in queries if not set")
+    parser.add_argument("--levels", default="1,2,4,8,16,32", help="concurrency ramp")
+    parser.add_argument("--duration", type=int, default=30, help="seconds per concurrency level")
+    parser.add_argument("--timeout", type=int, default=60, help="request timeout")
+    parser.add_argument("--startup-timeout", type=int, default=600, help="local server startup timeout")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="disable the query cache of the local server, every callback is computed")
+    args = parser.parse_args()
+
+    server = None
+    cache_dir = tempfile.TemporaryDirectory(prefix="lcn-loadtest-")
+
+    if args.url:
+        url, pid = args.url.rstrip("/"), args.pid
+    else:
+        server, url = start_server(
+            args.port, args.startup_timeout, os.path.join(cache_dir.name, "cache.sqlite"), not args.no_cache
+        )
+        pid = server.pid
+
+    try:
+        queries = [(tab, filters) for tab, filters, _ in read_query_log(args.log)] if args.log else DEFAULT_QUERIES
+        sessions = get_sessions(get_callbacks(url), queries)
+
+        print("{0:>11} {1:>9} {2:>9} {3:>9} {4:>9} {5:>9} {6:>7} {7:>7} {8:>9}".format(
+            "concurrency", "requests", "req/s", "p50 ms", "p90 ms", "p99 ms", "errors", "busy", "rss mb"))
+
+        for concurrency in [int(level) for level in args.levels.split(",")]:
+            stats = run_level(url, sessions, concurrency, args.duration, pid, args.timeout, bool(args.url))
+
+            print("{concurrency:>11} {requests:>9} {throughput:>9.1f} {p50:>9.0f} {p90:>9.0f} {p99:>9.0f} "
+                  "{errors:>7.1%} {shed:>7.1%} {rss:>9.0f}".format(**stats))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+        cache_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import os
+import sqlite3
+import time
+
+from contextlib import closing
+
+from lcn.__main__ import filter_data, get_tab2_aggregates, get_tab3_aggregates
+from lcn.cache import QueryCache, read_query_log
+from lcn.dataset import get_dataset_version, load_dataset, optimize_schema
+
+
+def get_popular_queries(queries, limit):
+    stats = {}
+
+    for tab, filters, duration in queries:
+        count, slowest = stats.get((tab, filters), (0, 0))
+        stats[(tab, filters)] = (count + 1, max(slowest, duration))
+
+    frequent = sorted(stats, key=lambda query: stats[query][0], reverse=True)[:limit]
+    slowest = sorted(stats, key=lambda query: stats[query][1], reverse=True)[:limit]
+
+    return list(dict.fromkeys(frequent + slowest))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute popular filter aggregates for a dataset build.")
+    parser.add_argument("--log", default=os.environ.get("LCN_QUERY_LOG", "/tmp/lcn-queries.jsonl"),
+                        help="query log")
+    parser.add_argument("--data", default=os.environ.get("LCN_DATA_PATH", "/data/it"), help="dataset path")
+    parser.add_argument("--period", type=int, action="append", help="period in months, can be repeated")
+    parser.add_argument("--output", help="warm cache file, default: <data>.warm.sqlite")
+    parser.add_argument("--limit", type=int, default=100, help="most frequent and slowest queries to replay")
+    parser.add_argument("--size", type=int, default=256, help="warm cache size in megabytes")
+    args = parser.parse_args()
+
+    periods = args.period or [int(os.environ.get("LCN_DATA_PERIOD", "3"))]
+    output = args.output or args.data.rstrip("/") + ".warm.sqlite"
+    queries = get_popular_queries(read_query_log(args.log), args.limit)
+
+    for period in periods:
+        df, _ = optimize_schema(load_dataset(args.data, period))
+        cache = QueryCache(output, get_dataset_version(df), args.size * 1024 * 1024)
+
+        keywords_exploded = df["keywords"].explode()
+        tags_exploded = df["tags"].explode()
+
+        for tab, filters in queries:
+            begin_time = time.time()
+
+            if tab == "tab2":
+                aggregates = get_tab2_aggregates(
+                    filter_data(df, *filters, keywords_exploded=keywords_exploded, tags_exploded=tags_exploded)
+                )
+            elif tab == "tab3":
+                aggregates = get_tab3_aggregates(filter_data(df, *filters))
+            else:
+                continue
+
+            cache.put((tab,) + filters, aggregates)
+
+            print("period: {0}, {1}: {2} ({3:.2f}s)".format(period, tab, list(filters), time.time() - begin_time))
+
+    # Shipped read-only with the dataset, no WAL side files.
+    with closing(sqlite3.connect(output)) as connection:
+        connection.execute("PRAGMA journal_mode=DELETE")
+
+
+if __name__ == "__main__":
+    main()
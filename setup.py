@@ -11,7 +11,10 @@ setup(
     include_package_data=True,
     entry_points={
         "console_scripts": [
-            "lazy-crow-nest=lcn.__main__:main"
+            "lazy-crow-nest=lcn.__main__:main",
+            "lazy-crow-nest-partition=lcn.dataset:main",
+            "lazy-crow-nest-prewarm=lcn.prewarm:main",
+            "lazy-crow-nest-loadtest=lcn.loadtest:main"
         ],
     }
 )
\ No newline at end of file
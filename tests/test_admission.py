@@ -0,0 +1,108 @@
+import threading
+import time
+
+from lcn.admission import AdmissionController, get_cost
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.time() + timeout
+
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert condition()
+
+
+def test_cost():
+    assert get_cost((None, None), 0, 0) == 1
+    assert get_cost(("Python", None, "Яндекс"), 0.5, 1000) == 1 + 2 + 2.5 + 2
+
+
+def test_capacity():
+    admission = AdmissionController(capacity=4, queue_size=4, session_limit=4, timeout=0.1)
+
+    assert admission.acquire("a", 3) == 3
+    assert admission.acquire("b", 2) is None
+    assert admission.acquire("b", 1) == 1
+    assert admission.load == 4
+
+
+def test_expensive_request_runs_alone():
+    admission = AdmissionController(capacity=4, queue_size=4, session_limit=4, timeout=0.1)
+
+    assert admission.acquire("a", 100) == 4
+    assert admission.acquire("b", 0.5) is None
+
+    admission.release("a", 4)
+
+    assert admission.load == 0
+    assert admission.acquire("b", 0.5) == 0.5
+
+
+def test_release_wakes_waiting():
+    admission = AdmissionController(capacity=1, queue_size=4, session_limit=4, timeout=5)
+    admission.acquire("a", 1)
+    result = []
+
+    thread = threading.Thread(target=lambda: result.append(admission.acquire("b", 1)))
+    thread.start()
+    wait_until(lambda: admission.waiting == 1)
+
+    admission.release("a", 1)
+    thread.join()
+
+    assert result == [1]
+    assert admission.sessions == {"b": 1}
+
+
+def test_queue_limit():
+    admission = AdmissionController(capacity=1, queue_size=1, session_limit=4, timeout=5)
+    admission.acquire("a", 1)
+
+    thread = threading.Thread(target=admission.acquire, args=("b", 1))
+    thread.start()
+    wait_until(lambda: admission.waiting == 1)
+
+    # The queue is full, rejected without waiting.
+    begin_time = time.time()
+    assert admission.acquire("c", 1) is None
+    assert time.time() - begin_time < 1
+    assert "c" not in admission.sessions
+
+    admission.release("a", 1)
+    thread.join()
+
+
+def test_session_limit():
+    admission = AdmissionController(capacity=10, queue_size=4, session_limit=2, timeout=0.1)
+
+    assert admission.acquire("a", 1) == 1
+    assert admission.acquire("a", 1) == 1
+    assert admission.acquire("a", 1) is None
+    assert admission.acquire("b", 1) == 1
+
+    admission.release("a", 1)
+
+    assert admission.acquire("a", 1) == 1
+
+
+def test_timeout_releases_session():
+    admission = AdmissionController(capacity=1, queue_size=4, session_limit=1, timeout=0.05)
+    admission.acquire("a", 1)
+
+    assert admission.acquire("b", 1) is None
+    assert admission.sessions == {"a": 1}
+    assert admission.waiting == 0
+
+
+def test_admit():
+    admission = AdmissionController(capacity=1, queue_size=4, session_limit=4, timeout=0.05)
+
+    with admission.admit("a", 1) as admitted:
+        assert admitted
+
+        with admission.admit("b", 1) as rejected:
+            assert not rejected
+
+    assert admission.load == 0
+    assert admission.sessions == {}
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from lcn.approximate import format_sample_error, get_sample_error, scale_counts
+
+
+def test_scale_counts():
+    values = pd.Series([1, 2, 3], index=["a", "b", "c"])
+
+    assert scale_counts(values, 1) is values
+    assert scale_counts(values, 10).tolist() == [10, 20, 30]
+    assert scale_counts(values, 1 / 0.3).dtype == np.int64
+
+
+def test_sample_error():
+    assert get_sample_error(0, 0.1) == 1.0
+    assert get_sample_error(100, 1) == 0.0
+    assert get_sample_error(1, 0.1) == 1.0
+    assert get_sample_error(400, 0.1) < get_sample_error(100, 0.1)
+    assert round(get_sample_error(10000, 0.1), 4) == round(1.96 * np.sqrt(0.9 / 10000), 4)
+
+
+def test_sample_error_covers_estimate():
+    # Scaled sample counts fall inside the bound in about 95% of samples.
+    rng = np.random.default_rng(0)
+    population = rng.random(100000) < 0.02
+    exact = population.sum()
+    inside = 0
+
+    for _ in range(200):
+        rows = rng.choice(population, size=10000, replace=False).sum()
+        inside += abs(rows / 0.1 - exact) <= get_sample_error(rows, 0.1) * exact
+
+    assert inside >= 180
+
+
+def test_format_sample_error():
+    assert format_sample_error(0, 0.1) == "~10% ±100%"
+    assert format_sample_error(10000, 0.1) == "~10% ±2%"
@@ -0,0 +1,124 @@
+import json
+import numpy as np
+import pandas as pd
+import pickle
+import sqlite3
+import time
+
+from contextlib import closing
+
+from lcn.cache import QueryCache, dump_value, load_value, log_query, normalize_filters, read_query_log
+
+
+def get_aggregates():
+    city = pd.Series(["Москва", "Москва", "Казань"], dtype="category")
+
+    return {
+        "city": city.value_counts(ascending=True),
+        "hour": pd.Series([9, 9, 10]).value_counts(ascending=True),
+        "keywords": pd.Series([], dtype=object).value_counts(),
+        "salary": [np.int64(100000), 200000, 0.5],
+        "currency": pd.Series(["RUB"]).value_counts()
+    }
+
+
+def test_normalize_filters():
+    assert normalize_filters("Python", "", "  ", 0, 100000, None) == ("Python", None, None, None, 100000.0, None)
+    assert normalize_filters("Java ") == ("Java ",)
+    assert normalize_filters(" Java") != normalize_filters("Java")
+
+
+def test_value_roundtrip():
+    aggregates = get_aggregates()
+    loaded = load_value(dump_value(aggregates))
+
+    assert loaded.keys() == aggregates.keys()
+    assert loaded["salary"] == [100000, 200000, 0.5]
+
+    # Categorical indexes come back as plain ones, figures only need the labels.
+    assert loaded["city"].to_dict() == {"Казань": 1, "Москва": 2}
+
+    for name in ["hour", "keywords", "currency"]:
+        pd.testing.assert_series_equal(loaded[name], aggregates[name], check_index_type=False)
+
+
+def test_get_put(tmp_path):
+    cache = QueryCache(str(tmp_path / "cache.sqlite"), "v1", 1024 * 1024)
+    key = ("tab2",) + normalize_filters("Python", None)
+
+    assert cache.get(key) is None
+
+    cache.put(key, get_aggregates())
+
+    assert cache.get(key)["hour"].to_dict() == {10: 1, 9: 2}
+    assert QueryCache(cache.path, "v2", 1024 * 1024).get(key) is None
+
+
+def test_foreign_values_are_not_loaded(tmp_path):
+    cache = QueryCache(str(tmp_path / "cache.sqlite"), "v1", 1024 * 1024)
+
+    class Exploit:
+        def __reduce__(self):
+            return exec, ("raise SystemExit",)
+
+    with closing(sqlite3.connect(cache.path)) as connection, connection:
+        for key, blob in [("a", pickle.dumps(Exploit())), ("b", b"{"), ("c", b'{"__series__": [1]}')]:
+            connection.execute("INSERT INTO cache VALUES (?, ?, ?, ?)", (cache.key([key]), blob, len(blob), 0))
+
+    assert cache.get(["a"]) is None
+    assert cache.get(["b"]) is None
+    assert cache.get(["c"]) is None
+
+
+def test_evict(tmp_path):
+    size = len(dump_value(get_aggregates()))
+    cache = QueryCache(str(tmp_path / "cache.sqlite"), "v1", size * 2)
+
+    for key in ["a", "b"]:
+        cache.put([key], get_aggregates())
+        time.sleep(0.01)
+
+    cache.get(["a"])
+    time.sleep(0.01)
+    cache.put(["c"], get_aggregates())
+
+    with closing(sqlite3.connect(cache.path)) as connection:
+        keys = [json.loads(key)[1] for key, in connection.execute("SELECT key FROM cache")]
+
+    assert sorted(keys) == ["a", "c"]
+
+
+def test_load(tmp_path):
+    warm = QueryCache(str(tmp_path / "warm.sqlite"), "v1", 1024 * 1024)
+    warm.put(["a"], [1])
+    QueryCache(warm.path, "v2", 1024 * 1024).put(["b"], [2])
+
+    cache = QueryCache(str(tmp_path / "cache.sqlite"), "v1", 1024 * 1024)
+    cache.load(warm.path)
+
+    assert cache.get(["a"]) == [1]
+    assert cache.get(["b"]) is None
+
+
+def test_query_log(tmp_path):
+    path = str(tmp_path / "queries.jsonl")
+
+    log_query("", "tab2", ("Python",), 0.1)
+    log_query(path, "tab2", ("Python", None), 0.123456)
+    log_query(path, "tab3", (None, "Москва"), 1)
+
+    assert list(read_query_log(path)) == [("tab2", ("Python", None), 0.1235), ("tab3", (None, "Москва"), 1)]
+
+
+def test_query_log_rotation(tmp_path):
+    path = str(tmp_path / "queries.jsonl")
+
+    for index in range(100):
+        log_query(path, "tab2", ("query{0}".format(index),), 0, max_size=1000)
+
+    assert (tmp_path / "queries.jsonl").stat().st_size < 1100
+    assert (tmp_path / "queries.jsonl.1").stat().st_size < 1100
+
+    queries = [filters[0] for _, filters, _ in read_query_log(path)]
+
+    assert queries == ["query{0}".format(index) for index in range(100 - len(queries), 100)]
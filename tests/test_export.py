@@ -0,0 +1,55 @@
+import io
+import pandas as pd
+import pyarrow.parquet as pq
+
+from lcn.__main__ import get_export_chunks, get_export_csv, get_export_parquet
+
+
+def get_data():
+    return pd.DataFrame({
+        "title": ["Java developer", "JavaScript developer", "Python developer"],
+        "city": ["Москва", "Казань", "Москва"],
+        "company": ["Сбер", "Сбер", "Яндекс"],
+        "keywords": [["java"], [], ["python", "django"]],
+        "tags": [[], [], ["backend"]],
+        "salary_from": [100000, 0, 200000],
+        "date": pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-03"])
+    })
+
+
+def test_export_parquet():
+    data = get_data()
+    table = pq.read_table(io.BytesIO(b"".join(get_export_parquet(data, get_export_chunks(data, 2, None, None, None)))))
+
+    assert table.num_rows == 3
+    assert table.column("keywords").to_pylist() == ["java", "", "python, django"]
+    assert table.column("date").to_pylist()[0] == pd.Timestamp("2024-01-01")
+
+
+def test_export_parquet_late_values():
+    # Company has no values in the first 20000 rows, the schema must not depend on them.
+    data = pd.concat([get_data()] * 10000, ignore_index=True)
+    data.loc[:19999, "company"] = None
+
+    chunks = get_export_chunks(data, 5000, None, None, None)
+    table = pq.read_table(io.BytesIO(b"".join(get_export_parquet(data, chunks))))
+
+    assert table.num_rows == 30000
+    assert str(table.schema.field("company").type) == "string"
+    assert table.column("company").to_pylist()[19999:20001] == [None, "Яндекс"]
+
+
+def test_export_filtered():
+    data = get_data()
+    chunks = get_export_chunks(data, 2, "Java ", "Москва", None)
+    table = pq.read_table(io.BytesIO(b"".join(get_export_parquet(data, chunks))))
+
+    assert table.column("title").to_pylist() == ["Java developer"]
+
+
+def test_export_csv():
+    data = get_data()
+    csv = "".join(get_export_csv(data, get_export_chunks(data, 2, None, "Москва", "Янд")))
+
+    assert csv.splitlines()[0] == ",".join(data.columns)
+    assert csv.splitlines()[1:] == ["Python developer,Москва,Яндекс,\"python, django\",backend,200000,2024-01-03"]
@@ -0,0 +1,16 @@
+import json
+
+from lcn.loadtest import is_shed
+
+
+def test_is_shed():
+    def body(label, tab="tab2"):
+        return json.dumps({"response": {tab: {"label": label}}}).encode()
+
+    assert is_shed(body("Details (busy)"))
+    assert is_shed(body("Details (busy, ~10% ±3%, 0.02s)"))
+    assert is_shed(body("Timeline (busy)", "tab3"))
+    assert not is_shed(body("Details (0.13s)"))
+    assert not is_shed(body("Details (~10% ±3%, 0.02s)"))
+    assert not is_shed(json.dumps({"response": {"tabs-content": {"children": []}}}).encode())
+    assert not is_shed(b"")